@@ -1,4 +1,5 @@
-from typing import Any, Callable, Dict, Iterable
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
 
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -29,6 +30,7 @@ class BaseAgent:
         input_key: str = "input",
         history_messages_key: str = "history",
         history_factory: Callable[[], BaseChatMessageHistory] | None = None,
+        max_sessions: int = 1000,
     ):
         # llm 必须符合 Runnable 协议，至少包含 invoke/stream
         if not hasattr(llm, "invoke"):
@@ -37,7 +39,9 @@ class BaseAgent:
         self.system_prompt = system_prompt.strip()
         self.input_key = input_key
         self.history_messages_key = history_messages_key
-        self._history_store: Dict[str, BaseChatMessageHistory] = {}
+        # 按最近使用顺序保存会话记忆，超过 max_sessions 时淘汰最久未用的会话
+        self._history_store: "OrderedDict[str, BaseChatMessageHistory]" = OrderedDict()
+        self.max_sessions = max_sessions
         self._history_factory = history_factory or ChatMessageHistory
 
         # 构建提示词与链路，并挂载对话记忆
@@ -62,9 +66,15 @@ class BaseAgent:
 
     # ----- Memory helpers ------------------------------------------------------
     def _get_history(self, session_id: str) -> BaseChatMessageHistory:
-        if session_id not in self._history_store:
-            self._history_store[session_id] = self._history_factory()
-        return self._history_store[session_id]
+        store = self._history_store
+        history = store.get(session_id)
+        if history is None:
+            history = store[session_id] = self._history_factory()
+            if len(store) > self.max_sessions:
+                store.popitem(last=False)
+        else:
+            store.move_to_end(session_id)
+        return history
 
     def _wrap_with_history(self, chain: Runnable) -> RunnableWithMessageHistory:
         return RunnableWithMessageHistory(
@@ -7,6 +7,7 @@ class Config:
     属性:
         api_key (str): 用于认证的 API 密钥。
         base_url (str): LLM 服务的基础 URL。   
+        llm_cache_backend (str): LLM 响应缓存后端（memory/sqlite/redis/none）。
     方法:
         load(): 从环境变量或配置文件中加载配置参数。
     """
@@ -16,6 +17,8 @@ class Config:
         self.base_url = os.getenv("DEEPSEEK_BASE_URL")
         self.chat_model = os.getenv("DEEPSEEK_MODEL") or os.getenv("LLM_MODEL") or "deepseek-chat"
         self.embedding_model = os.getenv("EMBEDDING_MODEL")
+        # LLM 响应缓存：memory / sqlite / redis / none
+        self.llm_cache_backend = (os.getenv("LLM_CACHE_BACKEND") or "sqlite").strip().lower()
         if not self.api_key:
             raise ValueError("❌ 未找到 DEEPSEEK_API_KEY，请检查 .env 文件！")
         if not self.base_url:
@@ -34,6 +37,9 @@ class Config:
 
     def get_chat_model(self) -> str:
         return self.chat_model
+
+    def get_llm_cache_backend(self) -> str:
+        return self.llm_cache_backend
         
 
 if __name__ == "__main__":
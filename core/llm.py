@@ -1,5 +1,8 @@
+import importlib.util
 import os
 from typing import Dict, Optional
+
+import httpx
 from langchain_openai import ChatOpenAI
 
 try:
@@ -27,6 +30,72 @@ _ALLOWED_PARAMS = {
     "presence_penalty",
 }
 
+# 全局 LLM 缓存只需安装一次（set_llm_cache 作用于进程内所有 ChatModel）
+_LLM_CACHE_INSTALLED = False
+_LLM_CACHE_PATH = ".langchain_cache.db"
+
+# 所有 ChatOpenAI 实例共享连接池，复用 TLS 连接（answer_iterative 多轮调用时尤为明显）
+_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+# 长回答生成可能较慢，读超时不宜过短
+_HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+# http2 需要可选依赖 h2（pip install "httpx[http2]"），缺失时退回 HTTP/1.1 连接池
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_HTTP_CLIENT: Optional[httpx.Client] = None
+
+
+def _get_http_client() -> httpx.Client:
+    """
+    懒创建进程内共享的同步 httpx 客户端。
+    异步客户端的连接绑定在创建它的事件循环上，跨 asyncio.run 共享会出错，
+    因此异步路径仍由 ChatOpenAI 按实例创建。
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.Client(http2=_HTTP2, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+    return _HTTP_CLIENT
+
+
+def _install_llm_cache(backend: Optional[str]) -> None:
+    """
+    按 backend 安装全局 LLM 缓存，相同 (prompt, model, params) 直接命中缓存。
+    - memory：进程内缓存，适合开发调试
+    - sqlite：单机持久化缓存
+    - redis：多进程/多实例共享，需安装 `redis` 并配置 REDIS_URL
+    - none / 空：不启用
+    """
+    global _LLM_CACHE_INSTALLED
+    if _LLM_CACHE_INSTALLED or not backend or backend == "none":
+        return
+
+    from langchain_core.globals import set_llm_cache
+
+    if backend == "memory":
+        from langchain_core.caches import InMemoryCache
+
+        cache = InMemoryCache()
+    elif backend == "sqlite":
+        from langchain_community.cache import SQLiteCache
+
+        cache = SQLiteCache(database_path=_LLM_CACHE_PATH)
+    elif backend == "redis":
+        try:
+            from redis import Redis
+        except ModuleNotFoundError as e:
+            raise ModuleNotFoundError(
+                "缺少依赖：`redis`。\n"
+                "请先安装：`pip install redis`，或将 LLM_CACHE_BACKEND 设为 sqlite/memory"
+            ) from e
+        from langchain_community.cache import RedisCache
+
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        cache = RedisCache(redis_=Redis.from_url(redis_url))
+    else:
+        raise ValueError(f"❌ 不支持的 LLM_CACHE_BACKEND：{backend}（可选 memory/sqlite/redis/none）")
+
+    set_llm_cache(cache)
+    _LLM_CACHE_INSTALLED = True
+
+
 class Model:
     """
     一个用于与 LLM 交互的模型类。
@@ -40,6 +109,7 @@ class Model:
         top_p (float): 用于 nucleus 采样的概率阈值。
         frequency_penalty (float): 控制重复词汇的惩罚程度。
         presence_penalty (float): 控制新话题引入的惩罚程度。
+        cache_backend (str | None): LLM 响应缓存后端（memory/sqlite/redis/none）。
     方法:
         create(): 初始化并返回一个 LLM 客户端实例。
     """
@@ -56,8 +126,10 @@ class Model:
         self.top_p = 1.0
         self.frequency_penalty = 0.0
         self.presence_penalty = 0.0
+        self.cache_backend: Optional[str] = None
     
     def create(self):
+        _install_llm_cache(self.cache_backend)
         return ChatOpenAI(
             model_name=self.model_name,
             temperature=self.temperature,
@@ -67,6 +139,7 @@ class Model:
             presence_penalty=self.presence_penalty,
             openai_api_key=self.api_key,
             openai_api_base=self.base_url,
+            http_client=_get_http_client(),
         )
     
     def set_model_name(self, model_name: str):
@@ -86,6 +159,9 @@ class Model:
         
     def set_presence_penalty(self, presence_penalty: float):
         self.presence_penalty = presence_penalty    
+
+    def set_cache_backend(self, cache_backend: Optional[str]):
+        self.cache_backend = cache_backend
         
     def __repr__(self):
         return (f"Model(model_name={self.model_name}, temperature={self.temperature}, "
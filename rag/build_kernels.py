@@ -0,0 +1,24 @@
+"""
+AOT 编译噪声过滤内核，部署后导入 rag.data_preparation 无需等待 JIT。
+
+用法（需安装 numba，在项目根目录执行）：
+    python -m rag.build_kernels
+生成的扩展模块 rag/rag_kernels*.so 会被 rag.kernels 优先加载。
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from numba.pycc import CC
+
+from rag.kernels import classify_chunk_bytes
+
+cc = CC("rag_kernels")
+cc.output_dir = str(Path(__file__).resolve().parent)
+cc.export("classify_chunk", "i8(u1[:])")(classify_chunk_bytes)
+
+
+if __name__ == "__main__":
+    cc.compile()
+    print(f"已生成 AOT 内核：{cc.output_dir}/rag_kernels")
@@ -0,0 +1,93 @@
+"""
+聊天记录持久化：按 thread_id 把界面上的消息写入本地 SQLite，会话重连时直接回放，无需重新运行 agent。
+- append 只入队，由后台线程批量写入，不阻塞 UI
+- 写入按时间窗口合并（默认 100ms），一批消息只提交一次事务
+"""
+
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# 单批消息的最大写入尝试次数
+_WRITE_ATTEMPTS = 3
+
+
+class ChatHistoryStore:
+    """
+    参数:
+        db_path: SQLite 文件路径，不存在时自动创建。
+        flush_interval_s: 写入合并窗口（秒）。
+    """
+
+    def __init__(self, db_path: str | Path, flush_interval_s: float = 0.1) -> None:
+        self.db_path = Path(db_path)
+        self.flush_interval_s = flush_interval_s
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "thread_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_thread ON history (thread_id, id)"
+            )
+        self._queue: "queue.Queue[Tuple[str, str, str]]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="chat-history-writer", daemon=True
+        )
+        self._writer.start()
+
+    def load(self, thread_id: str, limit: int = 200) -> List[Dict[str, str]]:
+        """按写入顺序返回该会话最近 limit 条消息。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT role, content FROM ("
+                "SELECT id, role, content FROM history WHERE thread_id = ? "
+                "ORDER BY id DESC LIMIT ?"
+                ") ORDER BY id",
+                (thread_id, limit),
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, thread_id: str, role: str, content: str) -> None:
+        self._queue.put((thread_id, role, content))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path))
+
+    def _write_loop(self) -> None:
+        # 写线程独占一个连接
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            # 等待一个合并窗口，把窗口内到达的消息并入同一事务
+            time.sleep(self.flush_interval_s)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(conn, batch)
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple[str, str, str]]) -> None:
+        """写入一批消息；失败（如多进程争用导致 database is locked）时重试，仍失败则丢弃该批，写线程继续运行。"""
+        for attempt in range(1, _WRITE_ATTEMPTS + 1):
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO history (thread_id, role, content) VALUES (?, ?, ?)",
+                        batch,
+                    )
+                return
+            except sqlite3.Error as e:
+                print(f"聊天记录写入失败（第 {attempt}/{_WRITE_ATTEMPTS} 次）：{e}")
+                time.sleep(self.flush_interval_s * attempt)
+        print(f"聊天记录写入多次失败，丢弃 {len(batch)} 条消息。")
@@ -1,4 +1,7 @@
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Iterable, List
 
@@ -6,6 +9,18 @@ from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from rag.kernels import HAS_KERNEL, classify_chunk
+
+# 清洗 / 噪声过滤用到的正则，模块加载时编译一次
+# 连字符断行；零宽空格不属于 \s，需显式包含（translate 在其后执行）
+_HYPHEN_BREAK = re.compile(r"-[\s\u200b]*\n[\s\u200b]*")
+_WS_RUN = re.compile(r"[ \t]+")
+_DOT_LEADER_SPACED = re.compile(r"(\.\s*){20,}")  # ". . . . . ."
+_DOT_LEADER = re.compile(r"\.{8,}")  # "........"
+_TRAILING_PAGENUM = re.compile(r"\s\d{1,4}\s*$")
+# 不换行空格 / 零宽空格 / 换行统一替换为空格，一次 translate 完成
+_CLEAN_TABLE = str.maketrans({"\xa0": " ", "\u200b": " ", "\n": " "})
+
 class DocumentIngestor:
     """
     负责 PDF 加载与文本切分。
@@ -20,6 +35,7 @@ class DocumentIngestor:
         loader: str = "auto",
         min_page_chars: int = 20,
         min_chunk_chars: int = 200,
+        max_workers: int | None = None,
         verbose: bool = False,
     ) -> None:
         # 分词器
@@ -31,35 +47,48 @@ class DocumentIngestor:
         self.loader = loader
         self.min_page_chars = min_page_chars
         self.min_chunk_chars = min_chunk_chars
+        # 多个 PDF 并行解析的进程数；None 表示使用全部 CPU，1 表示串行
+        self.max_workers = max_workers
         self.verbose = verbose
+
+        # 加载器类在初始化时解析一次，避免每个文件重复 import
+        self._primary_loader_cls = None
+        if loader in ("auto", "pdfplumber"):
+            try:
+                from langchain_community.document_loaders import PDFPlumberLoader
+            except ImportError:
+                if loader == "pdfplumber":
+                    raise
+            else:
+                self._primary_loader_cls = PDFPlumberLoader
+        self._fallback_loader_cls = PyPDFLoader
         
     """ 清洗页面内容的辅助方法 """
     def _clean_page_content(self, content: str) -> str:
-        content = content.replace("\xa0", " ").replace("\u200b", " ")
-        content = re.sub(r"-\s*\n\s*", "", content)  # 连字符断行
-        content = content.replace("\n", " ")
-        content = re.sub(r"[ \t]+", " ", content)
+        # 连字符断行需在换行被替换之前处理
+        content = _HYPHEN_BREAK.sub("", content)
+        content = content.translate(_CLEAN_TABLE)
+        content = _WS_RUN.sub(" ", content)
         return content.strip()
         
     """ 加载单个 PDF 文件 """
     def _load_single_pdf(self, pdf_path: Path) -> List[Document]:
         # LaTeX/两栏/公式较多的 PDF，pypdf 往往抽不到正文；优先尝试 pdfplumber。
         docs: List[Document] = []
-        if self.loader in ("auto", "pdfplumber"):
+        if self._primary_loader_cls is not None:
             try:
-                from langchain_community.document_loaders import PDFPlumberLoader
-
-                docs = PDFPlumberLoader(str(pdf_path)).load()
-                if self.verbose:
-                    print(f"使用 PDFPlumberLoader: {pdf_path}")
+                docs = self._primary_loader_cls(str(pdf_path)).load()
             except Exception as e:
                 if self.loader == "pdfplumber":
                     raise
                 if self.verbose:
                     print(f"PDFPlumberLoader 失败，回退 PyPDFLoader: {pdf_path} ({e})")
+            else:
+                if self.verbose:
+                    print(f"使用 PDFPlumberLoader: {pdf_path}")
 
         if not docs:
-            docs = PyPDFLoader(str(pdf_path)).load()
+            docs = self._fallback_loader_cls(str(pdf_path)).load()
             if self.verbose:
                 print(f"使用 PyPDFLoader: {pdf_path}")
 
@@ -76,19 +105,39 @@ class DocumentIngestor:
             cleaned_docs.append(cleaned_doc)
         return cleaned_docs
     
-    def load_documents(self, paths: Iterable[str]) -> List[Document]:
-        """从给定路径加载 PDF；目录会扫描所有 .pdf。"""
-        all_docs: List[Document] = []
-        print(f"开始加载文档, 文档个数: {len(paths)}")
+    def resolve_pdf_paths(self, paths: Iterable[str]) -> List[Path]:
+        """展开输入路径：目录扫描其下所有 .pdf，文件需为 .pdf。"""
+        pdf_paths: List[Path] = []
         for raw_path in paths:
             path = Path(raw_path)
             if path.is_dir():
-                for pdf_file in sorted(path.glob("*.pdf")):
-                    all_docs.extend(self._load_single_pdf(pdf_file))
+                pdf_paths.extend(sorted(path.glob("*.pdf")))
             elif path.is_file() and path.suffix.lower() == ".pdf":
-                all_docs.extend(self._load_single_pdf(path))
+                pdf_paths.append(path)
             else:
                 print(f"跳过不支持的路径: {raw_path}")
+        return pdf_paths
+
+    def load_documents(self, paths: Iterable[str]) -> List[Document]:
+        """从给定路径加载 PDF；目录会扫描所有 .pdf。多个文件时按进程并行解析。"""
+        all_docs: List[Document] = []
+        print(f"开始加载文档, 文档个数: {len(paths)}")
+        pdf_paths = self.resolve_pdf_paths(paths)
+
+        workers = min(self.max_workers or os.cpu_count() or 1, len(pdf_paths))
+        if workers <= 1:
+            for pdf_path in pdf_paths:
+                all_docs.extend(self._load_single_pdf(pdf_path))
+            return all_docs
+
+        # PDF 解析是 CPU 密集型；ex.map 保持与输入一致的顺序。
+        # 调用方（Streamlit / uvicorn / 后台建库线程）是多线程进程且已加载 torch、tokenizers，
+        # fork 可能继承被其他线程持有的锁而死锁，因此用 spawn 启动干净的子进程
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as ex:
+            for docs in ex.map(self._load_single_pdf, pdf_paths):
+                all_docs.extend(docs)
         return all_docs
     
     def split_documents(self, docs: List[Document]) -> List[Document]:
@@ -118,22 +167,27 @@ class DocumentIngestor:
         if not text:
             return True
 
+        # 多字节关键词留在 Python 中判断（少见且无法按 ASCII 字节扫描）
+        if ("目录" in text or "CONTENTS" in text.upper()) and len(text) < 1500:
+            return True
+
+        # 有编译内核（AOT 或 numba JIT）时，点号 leader / 页码 / CHAPTER 规则一次扫描完成
+        if HAS_KERNEL:
+            return classify_chunk(text) != 0
+
         # 目录常见的 leader：". . . . . . ." 或 "......"
-        if re.search(r"(\.\s*){20,}", text):
+        if _DOT_LEADER_SPACED.search(text):
             return True
-        if re.search(r"\.{8,}", text):
+        if _DOT_LEADER.search(text):
             return True
 
-        # 标题/目录页：关键词密集但信息量低
-        upper = text.upper()
-        if ("目录" in text or "CONTENTS" in upper) and len(text) < 1500:
-            return True
-        if ("CHAPTER" in upper) and len(text) < 400:
+        # 标题页：关键词密集但信息量低
+        if ("CHAPTER" in text.upper()) and len(text) < 400:
             return True
 
         # 目录页常见：很多行以页码结尾，且点号占比高
         dot_ratio = text.count(".") / max(1, len(text))
-        if dot_ratio > 0.18 and re.search(r"\s\d{1,4}\s*$", text):
+        if dot_ratio > 0.18 and _TRAILING_PAGENUM.search(text):
             return True
 
         return False
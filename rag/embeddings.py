@@ -9,11 +9,35 @@ RAG 向量化骨架（含 TODO）。
 from __future__ import annotations
 
 import os
-from typing import Optional, TYPE_CHECKING
+from functools import lru_cache
+from typing import List, Optional, TYPE_CHECKING
+
+from langchain_core.embeddings import Embeddings
 
 if TYPE_CHECKING:
     from langchain_huggingface import HuggingFaceEmbeddings
 
+
+class CachedEmbeddings(Embeddings):
+    """
+    为 embed_query 加一层 LRU 缓存的 Embeddings 适配器。
+    对话中同一问题会被语义缓存、检索工具、同义词扩展多次编码，命中缓存即可跳过前向计算。
+    embed_documents 直接透传（入库切片各不相同，缓存无收益）。
+    """
+
+    def __init__(self, inner: Embeddings, maxsize: int = 1024) -> None:
+        self.inner = inner
+        # 缓存 tuple，返回时复制为 list，避免调用方修改缓存内容
+        self._embed_query_cached = lru_cache(maxsize=maxsize)(
+            lambda text: tuple(inner.embed_query(text))
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        return list(self._embed_query_cached(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
 class EmbeddingProvider:
     """
     负责提供 embedding_function。
@@ -24,12 +48,24 @@ class EmbeddingProvider:
         self,
         model_name: str = "sentence-transformers/all-mpnet-base-v2",
         hf_endpoint: str | None = None,
+        device: str | None = None,
+        batch_size: int = 64,
+        normalize_embeddings: bool = True,
+        quantize: bool = True,
+        query_cache_size: int = 1024,
     ) -> None:
         self.model_name = model_name
         self.hf_endpoint = hf_endpoint
-        self._embedding_fn: Optional["HuggingFaceEmbeddings"] = None
+        self.device = device
+        self.batch_size = batch_size
+        self.normalize_embeddings = normalize_embeddings
+        # 检索场景下低精度推理：GPU 用 FP16，CPU 用 int8 动态量化（Recall 损失通常 <1%）
+        self.quantize = quantize
+        # embed_query 的 LRU 缓存条数；0 表示不缓存
+        self.query_cache_size = query_cache_size
+        self._embedding_fn: Optional[Embeddings] = None
         
-    def get(self) -> "HuggingFaceEmbeddings":
+    def get(self) -> Embeddings:
         """懒加载并返回 Embeddings 对象。"""
         if self._embedding_fn is None:
             try:
@@ -46,8 +82,55 @@ class EmbeddingProvider:
                 os.environ["HF_ENDPOINT"] = endpoint
 
             # TODO: 如需设置缓存目录：export HUGGINGFACE_HUB_CACHE=/path/to/cache
-            self._embedding_fn = HuggingFaceEmbeddings(model_name=self.model_name)
+            # 大 batch 一次前向编码整批切片，摊薄 Python 开销与 GPU launch 成本
+            device = self._resolve_device()
+            embedding_fn = HuggingFaceEmbeddings(
+                model_name=self.model_name,
+                model_kwargs={"device": device},
+                encode_kwargs={
+                    "batch_size": self.batch_size,
+                    "normalize_embeddings": self.normalize_embeddings,
+                },
+            )
+            if self.quantize:
+                self._quantize(embedding_fn, device)
+            if self.query_cache_size > 0:
+                embedding_fn = CachedEmbeddings(embedding_fn, maxsize=self.query_cache_size)
+            self._embedding_fn = embedding_fn
         return self._embedding_fn
+
+    def _quantize(self, embedding_fn: "HuggingFaceEmbeddings", device: str) -> None:
+        """将底层 SentenceTransformer 转为 FP16（GPU）或 int8 动态量化（CPU）。"""
+        # langchain_huggingface 新版为私有属性 _client，旧版为 client
+        attr = "_client" if getattr(embedding_fn, "_client", None) is not None else "client"
+        model = getattr(embedding_fn, attr, None)
+        if model is None:
+            return
+
+        import torch
+
+        if device.startswith("cuda"):
+            setattr(embedding_fn, attr, model.half())
+            return
+        try:
+            quantized = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        except (RuntimeError, AssertionError) as e:
+            # 部分平台缺少量化后端（如 fbgemm/qnnpack），保持 FP32
+            print(f"embedding 模型 int8 量化失败，继续使用 FP32：{e}")
+            return
+        setattr(embedding_fn, attr, quantized)
+
+    def _resolve_device(self) -> str:
+        """未显式指定时，有 GPU 用 cuda，否则回退 cpu。"""
+        if self.device:
+            return self.device
+        try:
+            import torch
+        except ModuleNotFoundError:
+            return "cpu"
+        return "cuda" if torch.cuda.is_available() else "cpu"
     
 # def main() -> None:
 #     """
@@ -0,0 +1,137 @@
+"""
+切片噪声过滤的字节扫描内核。
+- classify_chunk_bytes：纯 Python 实现，按字节一次扫描得到噪声特征位掩码
+- 优先加载 AOT 预编译模块 rag_kernels（见 rag/build_kernels.py）
+- 其次在安装了 numba 时用 @njit(cache=True) 编译为本地循环
+- 两者都不可用时 HAS_KERNEL=False，调用方回退正则实现
+
+注意：numba 为可选依赖，未安装时导入本模块不会报错。
+"""
+
+from __future__ import annotations
+
+import re
+
+# 噪声特征位掩码
+NOISE_DOT_LEADER_SPACED = 1  # (\.\s*){20,}
+NOISE_DOT_LEADER_DENSE = 2  # \.{8,}
+NOISE_PAGENUM_WITH_DOTS = 4  # 点号占比 > 0.18 且以页码结尾
+NOISE_CHAPTER_SHORT = 8  # 含 CHAPTER（不区分大小写）且长度 < 400
+
+
+# 正则的 \s / \d 按 Unicode 匹配（如全角空格 \u3000、全角数字）；
+# 非 ASCII 的空白 / 十进制数字先映射为 " " / "0"，判定才与正则实现一致
+_NON_ASCII_SPACE = re.compile(r"[^\S\x00-\x7f]")
+_NON_ASCII_DIGIT = re.compile(r"[^\D\x00-\x7f]")
+
+
+def to_kernel_bytes(text: str) -> bytes:
+    """
+    把文本转换为内核输入：长度与字符数一致的 ASCII 字节串。
+    非 ASCII 空白 -> " "，非 ASCII 十进制数字 -> "0"，其余非 ASCII 字符 -> "?"。
+    """
+    if not text.isascii():
+        text = _NON_ASCII_SPACE.sub(" ", text)
+        text = _NON_ASCII_DIGIT.sub("0", text)
+    return text.encode("ascii", "replace")
+
+
+def classify_chunk_bytes(buf) -> int:
+    """
+    对 ASCII 字节序列（uint8 数组或 bytes）做一次线性扫描，返回噪声特征位掩码。
+    输入应由 to_kernel_bytes 生成。
+    """
+    n = len(buf)
+    mask = 0
+    dots = 0
+    dense_run = 0
+    spaced_run = 0
+    # "CHAPTER" 的大写 ASCII 码
+    c0, c1, c2, c3, c4, c5, c6 = 67, 72, 65, 80, 84, 69, 82
+    matched = 0
+    for i in range(n):
+        c = buf[i]
+        is_space = c == 32 or (9 <= c <= 13) or (28 <= c <= 31)
+        if c == 46:
+            dots += 1
+            dense_run += 1
+            spaced_run += 1
+            if dense_run >= 8:
+                mask |= NOISE_DOT_LEADER_DENSE
+            if spaced_run >= 20:
+                mask |= NOISE_DOT_LEADER_SPACED
+        else:
+            dense_run = 0
+            if not is_space:
+                spaced_run = 0
+
+        # 逐字节匹配 "CHAPTER"（小写字母转大写）
+        u = c - 32 if 97 <= c <= 122 else c
+        if matched == 0:
+            want = c0
+        elif matched == 1:
+            want = c1
+        elif matched == 2:
+            want = c2
+        elif matched == 3:
+            want = c3
+        elif matched == 4:
+            want = c4
+        elif matched == 5:
+            want = c5
+        else:
+            want = c6
+        if u == want:
+            matched += 1
+            if matched == 7:
+                if n < 400:
+                    mask |= NOISE_CHAPTER_SHORT
+                matched = 0
+        else:
+            # "CHAPTER" 没有自重叠前缀，失配后只需判断当前字节能否作为开头
+            matched = 1 if u == c0 else 0
+
+    if n > 0 and dots / n > 0.18:
+        # \s\d{1,4}\s*$：跳过末尾空白，再数一段 1~4 位数字，且其前为空白
+        j = n - 1
+        while j >= 0 and (buf[j] == 32 or (9 <= buf[j] <= 13) or (28 <= buf[j] <= 31)):
+            j -= 1
+        digits = 0
+        while j >= 0 and 48 <= buf[j] <= 57:
+            digits += 1
+            j -= 1
+        if 1 <= digits <= 4 and j >= 0:
+            b = buf[j]
+            if b == 32 or (9 <= b <= 13) or (28 <= b <= 31):
+                mask |= NOISE_PAGENUM_WITH_DOTS
+    return mask
+
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+_classify_chunk_impl = None
+if np is not None:
+    try:
+        # 优先使用 `python -m rag.build_kernels` 预编译的 AOT 内核，无 JIT 冷启动
+        from rag.rag_kernels import classify_chunk as _classify_chunk_impl
+    except ImportError:
+        try:
+            from numba import njit
+        except ModuleNotFoundError:
+            pass
+        else:
+            # cache=True：编译结果写入 __pycache__，后续进程直接复用
+            _classify_chunk_impl = njit(cache=True)(classify_chunk_bytes)
+
+HAS_KERNEL = _classify_chunk_impl is not None
+
+
+def classify_chunk(text: str) -> int:
+    """用编译后的内核计算 text 的噪声位掩码（需 HAS_KERNEL 为 True）。"""
+    if _classify_chunk_impl is None:
+        raise RuntimeError("未安装 numba 且没有 AOT 内核，无法使用编译内核；请改用正则实现。")
+    buf = np.frombuffer(to_kernel_bytes(text), dtype=np.uint8)
+    return int(_classify_chunk_impl(buf))
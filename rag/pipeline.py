@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Iterable, Iterator, List, Optional
 
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-import json
+import orjson
 
 # 允许两种运行方式：
 # 1) 推荐：在项目根目录执行 `python -m rag.pipeline`
@@ -22,6 +24,34 @@ from rag.vector_store import VectorStoreManager
 from core.config import Config
 from core.llm import Model
 
+_DECISION_STATUSES = ("final", "need_more")
+# 建库文件清单：{pdf 路径: [mtime_ns, size]}，保存在向量库持久化目录下
+_MANIFEST_NAME = ".manifest.json"
+
+# 特定术语的“同义词/别名”扩展表；扩展词固定，其向量复用依赖 embedding_function 的 LRU 缓存
+# （EmbeddingProvider 返回的 CachedEmbeddings；自定义 embedding 或 query_cache_size=0 时不缓存）
+_QUERY_SYNONYMS = {
+    "混淆电路": ("Garbled Circuit", "姚氏混淆电路", "Yao"),
+}
+
+
+def _parse_decision(text: str) -> Optional[dict]:
+    """解析 answer_iterative 的决策 JSON；不是合法 JSON 或不符合约定格式时返回 None。"""
+    text = text.strip()
+    # LLM 常把 JSON 包在 ```json ... ``` 里：先剥掉围栏，避免走兜底的额外 LLM 调用
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else text.strip("`")
+        text = text.rsplit("```", 1)[0].strip()
+    try:
+        decision = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(decision, dict):
+        return None
+    if str(decision.get("status", "")).strip() not in _DECISION_STATUSES:
+        return None
+    return decision
+
 class RAGPipeline:
     """
     负责串联数据准备、向量库、检索与回答。
@@ -46,6 +76,8 @@ class RAGPipeline:
             config = Config()
             model = Model(api_key=config.get_api_key(),base_url=config.get_base_url())
             model.set_model_name(config.get_chat_model())
+            # 重复的 (问题, 检索上下文) 直接命中 LLM 缓存，answer / answer_iterative 均受益
+            model.set_cache_backend(config.get_llm_cache_backend())
             self.llm = model.create()
         
     def build_index(
@@ -53,63 +85,196 @@ class RAGPipeline:
         paths: Iterable[str],
         reset: bool = False,
         skip_if_exists: bool = True,
-    ) -> None:
-        """加载 -> 切分 -> 写入向量库。"""
+    ) -> bool:
+        """
+        加载 -> 切分 -> 写入向量库。
+        按文件 (mtime, size) 清单增量更新：只重新入库新增/变化的 PDF，
+        并删除变化或已移除文件的旧切片；写入依赖稳定 ID 的 upsert，可重复执行。
+        skip_if_exists=False 时忽略清单，全部文件重新写入。
+        返回向量库内容是否发生变化。
+        """
+        paths = list(paths)
+        pdf_paths = self.ingestor.resolve_pdf_paths(paths)
+        manifest: dict[str, list[int]] = {}
+        for p in pdf_paths:
+            stat = p.stat()
+            manifest[str(p)] = [stat.st_mtime_ns, stat.st_size]
+
+        previous: dict[str, list[int]] = {}
         if reset:
             self.vector_store.reset_collection()
-        elif skip_if_exists and self.vector_store.count() > 0:
-            print(f"检测到向量库已有 {self.vector_store.count()} 条记录，跳过重建。")
-            return
-        chunks = self.ingestor.ingest(paths)
+        else:
+            loaded = self._load_manifest()
+            if loaded is None and skip_if_exists and self.vector_store.count() > 0:
+                # 旧版向量库没有清单：沿用“已有数据即跳过”，并记录清单供后续增量更新
+                print(f"检测到向量库已有 {self.vector_store.count()} 条记录，跳过重建。")
+                self._save_manifest(manifest)
+                return False
+            # 清单存在但向量库为空（例如被手动清空）时，清单不可信，全部重建
+            if loaded and self.vector_store.count() > 0:
+                previous = loaded
+
+        if skip_if_exists:
+            changed = [p for p in pdf_paths if previous.get(str(p)) != manifest[str(p)]]
+        else:
+            changed = list(pdf_paths)
+        # 清单覆盖整个向量库，本次只扫描了 paths：范围外的条目（其他目录的文件）原样保留，
+        # 只有范围内变化或已移除的文件才视为过期
+        stale: List[str] = []
+        for src, entry in previous.items():
+            if not self._in_scope(src, paths):
+                manifest.setdefault(src, entry)
+            elif manifest.get(src) != entry:
+                stale.append(src)
+        if stale:
+            self.vector_store.delete_sources(stale)
+            print(f"已删除 {len(stale)} 个变化/移除文件的旧切片。")
+
+        if not changed:
+            print(f"向量库已是最新（{self.vector_store.count()} 条记录），跳过重建。")
+            self._save_manifest(manifest)
+            return reset or bool(stale)
+
+        chunks = self.ingestor.ingest([str(p) for p in changed])
         if not chunks:
             print("没有可写入的文档。")
-            return
+            self._save_manifest(manifest)
+            return reset or bool(stale)
         ids = self.vector_store.add_documents(chunks)
-        print(f"已写入向量库：{len(ids)} 条。")
+        self._save_manifest(manifest)
+        print(f"已写入向量库：{len(ids)} 条（{len(changed)} 个文件）。")
+        return True
+
+    @staticmethod
+    def _in_scope(source: str, paths: Iterable[str]) -> bool:
+        """清单条目是否在 paths 的扫描范围内：目录只含其下一层的文件（与 resolve_pdf_paths 一致），文件只含自身。"""
+        src = Path(source).resolve()
+        for raw_path in paths:
+            root = Path(raw_path).resolve()
+            if src == root or src.parent == root:
+                return True
+        return False
+
+    def _manifest_path(self) -> Optional[Path]:
+        persist_directory = self.vector_store.persist_directory
+        if not persist_directory:
+            return None
+        return Path(persist_directory) / _MANIFEST_NAME
+
+    def _load_manifest(self) -> Optional[dict[str, list[int]]]:
+        """读取上次建库的文件清单；不存在或损坏时返回 None。"""
+        path = self._manifest_path()
+        if path is None or not path.is_file():
+            return None
+        try:
+            data = orjson.loads(path.read_bytes())
+        except orjson.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _save_manifest(self, manifest: dict[str, list[int]]) -> None:
+        path = self._manifest_path()
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(orjson.dumps(manifest))
         
     def retrieve(self, query: str, k: int = 3) -> List[Document]:
         """仅做相似度检索。"""
         return self.vector_store.similarity_search(query, k=k)
 
-    def retrieve_with_synonyms(self, query: str, k: int = 3) -> List[Document]:
+    async def aretrieve(self, query: str, k: int = 3) -> List[Document]:
+        """retrieve() 的异步版本。"""
+        return await self.vector_store.asimilarity_search(query, k=k)
+
+    @staticmethod
+    def _expand_queries(query: str) -> List[str]:
         """
-        针对特定术语做“同义词/别名”扩展检索，并合并去重。
+        针对特定术语做“同义词/别名”扩展。
         你目前关心：混淆电路 / Garbled Circuit / 姚氏混淆电路 / Yao
         """
         queries: List[str] = [query]
-        if "混淆电路" in query:
-            queries.extend(["Garbled Circuit", "姚氏混淆电路", "Yao"])
+        for term, synonyms in _QUERY_SYNONYMS.items():
+            if term in query:
+                queries.extend(synonyms)
+        return queries
+
+    def _retrieve_synonym(self, synonym: str, k: int = 3) -> List[Document]:
+        """固定扩展词：查询向量由 CachedEmbeddings 的 LRU 缓存命中，直接做向量检索。"""
+        vec = self.vector_store.embedding_function.embed_query(synonym)
+        return self.vector_store.similarity_search_by_vector(vec, k=k)
+
+    @staticmethod
+    def _doc_key(d: Document) -> tuple:
+        """切片去重键：source/page/start_index + 内容前缀。"""
+        meta = d.metadata or {}
+        return (
+            meta.get("source"),
+            meta.get("page"),
+            meta.get("start_index"),
+            (d.page_content or "")[:80],
+        )
 
+    @classmethod
+    def _merge_unique(cls, results: Iterable[List[Document]]) -> List[Document]:
+        """按查询顺序合并多路检索结果并去重。"""
         seen: set[tuple] = set()
         merged: List[Document] = []
-        for q in queries:
-            for d in self.retrieve(q, k=k):
-                meta = d.metadata or {}
-                key = (
-                    meta.get("source"),
-                    meta.get("page"),
-                    meta.get("start_index"),
-                    (d.page_content or "")[:80],
-                )
+        for docs in results:
+            for d in docs:
+                key = cls._doc_key(d)
                 if key in seen:
                     continue
                 seen.add(key)
                 merged.append(d)
         return merged
+
+    def retrieve_with_synonyms(self, query: str, k: int = 3) -> List[Document]:
+        """针对特定术语做“同义词/别名”扩展检索，并合并去重。"""
+        queries = self._expand_queries(query)
+
+        # 多个扩展查询互不依赖，并发检索；扩展词的向量命中 embedding 的 LRU 缓存
+        if len(queries) > 1:
+            with ThreadPoolExecutor(max_workers=len(queries)) as ex:
+                first = ex.submit(self.retrieve, query, k)
+                rest = list(ex.map(lambda q: self._retrieve_synonym(q, k=k), queries[1:]))
+                results = [first.result(), *rest]
+        else:
+            results = [self.retrieve(query, k=k)]
+        return self._merge_unique(results)
+
+    async def _aretrieve_synonym(self, synonym: str, k: int = 3) -> List[Document]:
+        """_retrieve_synonym() 的异步版本：embedding 在 aembed_query 中计算，不阻塞事件循环。"""
+        vec = await self.vector_store.embedding_function.aembed_query(synonym)
+        return await self.vector_store.asimilarity_search_by_vector(vec, k=k)
+
+    async def aretrieve_with_synonyms(self, query: str, k: int = 3) -> List[Document]:
+        """retrieve_with_synonyms() 的异步版本：扩展查询通过 asyncio.gather 并发检索。"""
+        queries = self._expand_queries(query)
+        results = await asyncio.gather(
+            self.aretrieve(query, k=k),
+            *(self._aretrieve_synonym(q, k=k) for q in queries[1:]),
+        )
+        return self._merge_unique(results)
     
     def answer(self, query: str, k: int = 3) -> str:
         """将检索结果送入 LLM，生成最终答案。"""
+        return "".join(self.answer_stream(query, k=k))
+
+    def answer_stream(self, query: str, k: int = 3) -> Iterator[str]:
+        """与 answer() 相同，但按 token 流式产出，首 token 即可展示。"""
         docs = self.retrieve_with_synonyms(query, k=k)
         if not docs:
-            return "我没有检索到相关文档，所以无法回答该问题。请看你的初始设置是否正确。"
+            yield "我没有检索到相关文档，所以无法回答该问题。请看你的初始设置是否正确。"
+            return
         context = "\n\n".join(f"[{i+1}] {d.page_content}" for i, d in enumerate(docs))
         prompt = ChatPromptTemplate.from_template(
             "你是知识助手。请依据检索到的内容作答，中文回答。\n"
             "检索内容：\n{context}\n\n问题：{question}"
         )
         chain = prompt | self.llm
-        msg = chain.invoke({"context": context, "question": query})
-        return getattr(msg, "content", str(msg))
+        for chunk in chain.stream({"context": context, "question": query}):
+            yield getattr(chunk, "content", str(chunk))
     
     def answer_iterative(
         self,
@@ -129,12 +294,18 @@ class RAGPipeline:
 
         def _format_docs(docs: List[Document]) -> str:
             parts: List[str] = []
+            size = 0
             for i, d in enumerate(docs, start=1):
+                # 已超出上限的片段最终会被截掉，不再格式化
+                if size >= max_context_chars:
+                    break
                 meta = d.metadata or {}
                 src = meta.get("source", "")
                 page = meta.get("page", "")
                 snippet = d.page_content[:1200]
-                parts.append(f"[{i}] source={src} page={page}\n{snippet}")
+                part = f"[{i}] source={src} page={page}\n{snippet}"
+                parts.append(part)
+                size += len(part) + (2 if i > 1 else 0)
             text = "\n\n".join(parts)
             return text[:max_context_chars]
 
@@ -153,15 +324,24 @@ class RAGPipeline:
         current_query = question
         seen_queries: set[str] = set()
         accumulated_docs: List[Document] = []
+        # 每个切片只进入上下文一次，避免多轮累积后上下文重复膨胀
+        seen_doc_keys: set[tuple] = set()
 
         for _round in range(1, max_rounds + 1):
             if current_query in seen_queries:
                 break
             seen_queries.add(current_query)
 
-            docs = self.retrieve_with_synonyms(current_query, k=k)
-            if docs:
-                accumulated_docs.extend(docs)
+            docs_before = len(accumulated_docs)
+            for d in self.retrieve_with_synonyms(current_query, k=k):
+                key = self._doc_key(d)
+                if key in seen_doc_keys:
+                    continue
+                seen_doc_keys.add(key)
+                accumulated_docs.append(d)
+            # 本轮没有新增检索内容时，再次决策只会得到同样的结论，直接进入最终回答
+            if _round > 1 and len(accumulated_docs) == docs_before:
+                break
 
             context = _format_docs(accumulated_docs)
             decision_msg = (decide_prompt | self.llm).invoke(
@@ -169,9 +349,8 @@ class RAGPipeline:
             )
             decision_text = getattr(decision_msg, "content", str(decision_msg)).strip()
 
-            try:
-                decision = json.loads(decision_text)
-            except Exception:
+            decision = _parse_decision(decision_text)
+            if decision is None:
                 # 解析失败则兜底回答一次，避免死循环
                 fallback_prompt = ChatPromptTemplate.from_template(
                     "请依据以下检索内容回答问题，中文简洁回答。\n\n"
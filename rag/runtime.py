@@ -0,0 +1,259 @@
+"""
+进程级单例：RAGPipeline / Agent graph / 语义缓存 / 聊天记录存储。
+
+Streamlit 每次 rerun 都会重新执行主脚本，脚本内的模块级变量会被重置；
+放在被导入的模块里，单例在进程内只构建一次，且不经过 st.cache_resource 的参数哈希查找。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, Optional, TYPE_CHECKING
+
+# 重量级依赖（langchain agents / langgraph / embedding / chroma）在首次构建时才导入，
+# 让导入本模块（以及 Streamlit 脚本冷启动）保持轻量
+if TYPE_CHECKING:
+    from rag.chat_history import ChatHistoryStore
+    from rag.pipeline import RAGPipeline
+    from rag.semantic_cache import SemanticCache
+
+# 可重入：get_agent_graph 在持锁时还会调用 get_pipeline
+_INIT_LOCK = threading.RLock()
+# 轻量单例（聊天记录存储、预热标记）使用独立的锁：预热线程在 _INIT_LOCK 内加载模型期间，
+# 页面首次渲染不会被阻塞
+_LIGHT_LOCK = threading.Lock()
+# 建库 / 增量同步共用一个向量库与清单文件，同一进程内必须串行执行
+_INDEX_LOCK = threading.Lock()
+_PIPELINE: Optional["RAGPipeline"] = None
+_AGENT = None
+_SEMANTIC_CACHE: Optional["SemanticCache"] = None
+_CHAT_HISTORY: Optional["ChatHistoryStore"] = None
+_PREWARM_STARTED = False
+# 后台任务（如重建向量库）的单线程池：同一时刻只跑一个任务，多次提交按顺序执行
+_BACKGROUND = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-bg")
+# LangGraph 对话状态的 SQLite 存储位置（不放在向量库目录下，重建或清理向量库时不受影响）
+CHECKPOINT_DB_PATH = Path("./user_data/checkpoints.sqlite")
+# 界面聊天记录的 SQLite 存储位置，供会话重连时回放
+CHAT_HISTORY_DB_PATH = Path("./user_data/chat_history.sqlite")
+# 检索 Tool 每轮的片段数与上下文字数上限（按问题长度在此范围内收缩，见 rag.tools.context_budget）
+RETRIEVAL_K = 5
+RETRIEVAL_MAX_CHARS = 7000
+
+# 系统提示词必须逐字节固定（不拼接时间、会话等动态内容）：create_agent 将其作为首条消息发送，
+# 服务端的前缀 KV 缓存（DeepSeek 上下文硬盘缓存 / vLLM enable_prefix_caching）才能跨轮次命中
+SYSTEM_PROMPT = """你是一个中文知识助手。你可以调用工具从本地知识库检索内容。
+当用户的问题需要依据文档回答时：先调用 rag_retrieve 获取上下文，再基于上下文回答。
+回答要求：
+- 若上下文中没有答案，明确说明“文档未包含”。
+- 尽量给出引用（用 [n] 标号即可）。
+"""
+
+
+def get_pipeline() -> "RAGPipeline":
+    global _PIPELINE
+    if _PIPELINE is None:
+        with _INIT_LOCK:
+            if _PIPELINE is None:
+                from rag.pipeline import RAGPipeline
+
+                _PIPELINE = RAGPipeline()
+    return _PIPELINE
+
+
+def get_semantic_cache() -> "SemanticCache":
+    global _SEMANTIC_CACHE
+    if _SEMANTIC_CACHE is None:
+        with _INIT_LOCK:
+            if _SEMANTIC_CACHE is None:
+                from rag.semantic_cache import SemanticCache
+
+                # 复用检索用的 embedding 模型（已加载），不额外占用内存
+                pipeline = get_pipeline()
+                _SEMANTIC_CACHE = SemanticCache(
+                    pipeline.vector_store.embedding_function.embed_query
+                )
+    return _SEMANTIC_CACHE
+
+
+def get_agent_graph() -> object:
+    global _AGENT
+    if _AGENT is None:
+        with _INIT_LOCK:
+            if _AGENT is None:
+                _AGENT = _build_agent_graph(get_pipeline())
+    return _AGENT
+
+
+def get_chat_history() -> "ChatHistoryStore":
+    global _CHAT_HISTORY
+    if _CHAT_HISTORY is None:
+        with _LIGHT_LOCK:
+            if _CHAT_HISTORY is None:
+                from rag.chat_history import ChatHistoryStore
+
+                _CHAT_HISTORY = ChatHistoryStore(CHAT_HISTORY_DB_PATH)
+    return _CHAT_HISTORY
+
+
+def start_prewarm() -> None:
+    """
+    在后台线程构建 pipeline / 语义缓存 / agent（加载 embedding 模型、打开向量库），
+    让第一个真实问题不必等待模型加载。重复调用无副作用；预热失败时首次使用会再次构建并抛出异常。
+    """
+    global _PREWARM_STARTED
+    with _LIGHT_LOCK:
+        if _PREWARM_STARTED:
+            return
+        _PREWARM_STARTED = True
+
+    def _warm() -> None:
+        get_semantic_cache()
+        get_agent_graph()
+
+    threading.Thread(target=_warm, name="rag-prewarm", daemon=True).start()
+
+
+def submit_background(fn: Callable, *args, **kwargs) -> Future:
+    """提交耗时任务到后台线程，调用方在之后的 rerun 中轮询 future.done()。"""
+    return _BACKGROUND.submit(fn, *args, **kwargs)
+
+
+def ensure_index(data_dir: str, reset: bool = False) -> None:
+    """
+    准备向量库。reset=True 时强制重建；否则按文件清单增量更新（只 stat 比对，无变化时很快），
+    新增 / 变化的 PDF 入库，已移除文件的切片删除。
+    向量库有变化时清空语义缓存（旧回答基于旧文档，不再可信）。
+    并发调用（多个会话、后台重建、sidecar 的并发请求）按顺序执行。
+    """
+    pipeline = get_pipeline()
+    with _INDEX_LOCK:
+        if reset:
+            changed = pipeline.build_index([data_dir], reset=True, skip_if_exists=False)
+        else:
+            changed = pipeline.build_index([data_dir], reset=False, skip_if_exists=True)
+    if changed and _SEMANTIC_CACHE is not None:
+        _SEMANTIC_CACHE.clear()
+
+
+def stream_agent_reply(user_text: str, thread_id: str) -> Iterator[Optional[str]]:
+    """
+    以 messages 模式流式运行 agent，逐段产出回答文本。
+    - 只产出模型输出的 AI 消息片段，工具返回的检索上下文不展示
+    - 产出 None 表示此前的中间文本作废：工具调用后模型会重新作答，只保留最后一轮回答
+    """
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    from rag.tools import context_budget
+
+    agent_graph = get_agent_graph()
+    # 检索片段数与上下文上限按本轮问题长度决定，graph 与 Tool 保持缓存不重建
+    rag_k, rag_max_chars = context_budget(
+        user_text, max_k=RETRIEVAL_K, max_chars=RETRIEVAL_MAX_CHARS
+    )
+    config = {
+        "configurable": {
+            "thread_id": thread_id,
+            "rag_k": rag_k,
+            "rag_max_chars": rag_max_chars,
+        }
+    }
+    # 最后一轮回答是否已产出过文本
+    produced = False
+    # create_agent 的 graph 走的是 messages state；thread_id 用于记忆
+    for msg_chunk, _meta in agent_graph.stream(
+        {"messages": [("user", user_text)]},
+        config=config,
+        stream_mode="messages",
+    ):
+        if isinstance(msg_chunk, ToolMessage):
+            produced = False
+            yield None
+            continue
+        # AIMessageChunk 是 AIMessage 子类；LLM 缓存命中时会直接产出完整 AIMessage
+        if not isinstance(msg_chunk, AIMessage):
+            continue
+        content = msg_chunk.content
+        if isinstance(content, str) and content:
+            produced = True
+            yield content
+
+    if not produced:
+        # 流中没有文本片段（如 content 为分段列表）时，从 checkpoint 只读取最后一条消息兜底
+        messages = agent_graph.get_state(config).values.get("messages", [])
+        if messages and isinstance(messages[-1], AIMessage):
+            text = messages[-1].text
+            if text:
+                yield text
+
+
+def stream_turn(user_text: str, thread_id: str) -> Iterator[Optional[str]]:
+    """
+    一轮对话：语义相近的问题直接复用历史回答，跳过检索与生成；
+    未命中则流式运行 agent，结束后写回语义缓存。产出约定同 stream_agent_reply。
+    语义缓存在进程内共享、不区分会话，只在会话首轮（checkpoint 为空）查询与写入：
+    “继续”“详细说说”这类追问依赖上下文，不能复用其他会话的回答。
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    agent_graph = get_agent_graph()
+    config = {"configurable": {"thread_id": thread_id}}
+    if agent_graph.get_state(config).values.get("messages"):
+        yield from stream_agent_reply(user_text, thread_id)
+        return
+
+    semantic_cache = get_semantic_cache()
+    query_vec = semantic_cache.embed(user_text)
+    cached = semantic_cache.lookup(user_text, embedding=query_vec)
+    if cached is not None:
+        # 命中时也把这一轮写入 checkpoint，agent 的对话记忆与界面历史保持一致；
+        # 以 model 节点的身份写入，无工具调用的 AI 消息使图停在结束状态
+        agent_graph.update_state(
+            config,
+            {"messages": [HumanMessage(content=user_text), AIMessage(content=cached)]},
+            as_node="model",
+        )
+        yield cached
+        return
+
+    acc = ""
+    for piece in stream_agent_reply(user_text, thread_id):
+        acc = "" if piece is None else acc + piece
+        yield piece
+    semantic_cache.put(user_text, acc, embedding=query_vec)
+
+
+def _build_agent_graph(pipeline: "RAGPipeline") -> object:
+    from langchain.agents.factory import create_agent
+
+    from rag.tools import make_retrieval_tool
+
+    rag_tool = make_retrieval_tool(pipeline, k=RETRIEVAL_K, max_chars=RETRIEVAL_MAX_CHARS)
+
+    # SqliteSaver：按 thread_id 维护对话状态，每轮只增量写入新的 checkpoint
+    checkpointer = _make_checkpointer()
+    graph = create_agent(
+        model=pipeline.llm,
+        tools=[rag_tool],
+        system_prompt=SYSTEM_PROMPT,
+        checkpointer=checkpointer,
+    )
+    return graph
+
+
+def _make_checkpointer():
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ModuleNotFoundError as e:
+        raise ModuleNotFoundError(
+            "缺少依赖：`langgraph-checkpoint-sqlite`。\n"
+            "请先安装：`pip install langgraph-checkpoint-sqlite`"
+        ) from e
+
+    CHECKPOINT_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Streamlit 各会话在不同线程中运行，连接需跨线程共享；WAL 让读写互不阻塞
+    conn = sqlite3.connect(str(CHECKPOINT_DB_PATH), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return SqliteSaver(conn)
@@ -0,0 +1,104 @@
+"""
+语义缓存：问题向量与历史问题的余弦相似度超过阈值时，直接复用历史回答。
+- 进程内存储，LRU + TTL 淘汰
+- 相似度用一次矩阵乘法 (N, d) @ (d,) 计算
+- 向量库重建后应调用 clear()，避免返回基于旧文档的回答
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    按问题语义缓存回答。
+    参数:
+        embed_query: 文本 -> 向量，通常复用检索用的 embedding_function.embed_query。
+        threshold: 余弦相似度命中阈值。
+        max_entries: 最多缓存条数，超出时淘汰最久未命中的条目。
+        ttl_seconds: 条目有效期（秒）。
+    """
+
+    def __init__(
+        self,
+        embed_query: Callable[[str], List[float]],
+        threshold: float = 0.92,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600.0,
+    ) -> None:
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # query -> (单位向量, 回答, 写入时间)
+        self._entries: "OrderedDict[str, tuple[np.ndarray, str, float]]" = OrderedDict()
+        # 由 _entries 派生的 (N, d) 矩阵，条目变化时置空、查询时再重建
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+
+    def embed(self, query: str) -> np.ndarray:
+        """计算归一化后的问题向量，可传给 lookup/put 以避免重复 embedding。"""
+        vec = np.asarray(self.embed_query(query), dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def lookup(self, query: str, embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        """命中时返回缓存的回答，否则返回 None。"""
+        with self._lock:
+            self._evict_expired()
+            if not self._entries:
+                return None
+            hit = self._entries.get(query)
+            if hit is not None:
+                self._entries.move_to_end(query)
+                return hit[1]
+
+        vec = embedding if embedding is not None else self.embed(query)
+        with self._lock:
+            if not self._entries:
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.vstack([self._entries[k][0] for k in self._keys])
+            sims = self._matrix @ vec
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                return None
+            key = self._keys[best]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, query: str, answer: str, embedding: Optional[np.ndarray] = None) -> None:
+        if not answer:
+            return
+        vec = embedding if embedding is not None else self.embed(query)
+        with self._lock:
+            self._entries[query] = (vec, answer, time.monotonic())
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._keys = []
+
+    def _evict_expired(self) -> None:
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [k for k, (_, _, ts) in self._entries.items() if ts < deadline]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
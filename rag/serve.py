@@ -0,0 +1,74 @@
+"""
+RAG 推理 sidecar：进程内只加载一份 embedding 模型 / 向量库 / agent，供所有 Streamlit worker 共享。
+
+启动（项目根目录）：
+    uvicorn rag.serve:app --port 8800
+Streamlit 侧设置环境变量 RAG_SERVE_URL=http://localhost:8800 后改为调用本服务。
+
+接口：
+- POST /chat  {thread_id, text}  -> text/event-stream，事件为 {"type": "delta"|"reset"|"done", "text"?}
+- POST /index {data_dir, reset}  -> {"count": 向量库记录数}
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import Iterator
+
+import orjson
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from rag.runtime import ensure_index, get_pipeline, start_prewarm, stream_turn
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    # 服务启动即在后台加载模型与向量库，首个请求无需等待
+    start_prewarm()
+    yield
+
+
+app = FastAPI(title="RAG-pdf", lifespan=_lifespan)
+
+
+class ChatRequest(BaseModel):
+    thread_id: str
+    text: str
+
+
+class IndexRequest(BaseModel):
+    data_dir: str = "user_data/documents"
+    reset: bool = False
+
+
+def _sse(event: dict) -> bytes:
+    return b"data: " + orjson.dumps(event) + b"\n\n"
+
+
+def _chat_events(req: ChatRequest) -> Iterator[bytes]:
+    for piece in stream_turn(req.text, req.thread_id):
+        if piece is None:
+            yield _sse({"type": "reset"})
+        else:
+            yield _sse({"type": "delta", "text": piece})
+    yield _sse({"type": "done"})
+
+
+@app.post("/chat")
+def chat(req: ChatRequest) -> StreamingResponse:
+    # 同步生成器由 Starlette 放到线程池中迭代，不阻塞事件循环
+    return StreamingResponse(_chat_events(req), media_type="text/event-stream")
+
+
+@app.post("/index")
+def index(req: IndexRequest) -> dict:
+    ensure_index(req.data_dir, reset=req.reset)
+    return {"count": get_pipeline().vector_store.count()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=8800)
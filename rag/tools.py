@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Tuple
 
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
 from rag.pipeline import RAGPipeline
@@ -10,29 +11,49 @@ from rag.pipeline import RAGPipeline
 
 def _format_docs_for_context(docs: List[Document], max_chars: int = 6000) -> str:
     parts: List[str] = []
+    size = 0
     for i, d in enumerate(docs, start=1):
+        # 已超出上限的片段最终会被截掉，不再格式化
+        if size >= max_chars:
+            break
         meta = d.metadata or {}
         source = meta.get("source", "")
         page = meta.get("page", "")
         content = (d.page_content or "").strip()
-        parts.append(f"[{i}] source={source} page={page}\n{content}")
+        part = f"[{i}] source={source} page={page}\n{content}"
+        parts.append(part)
+        size += len(part) + (2 if i > 1 else 0)
     text = "\n\n".join(parts)
     return text[:max_chars]
 
 
+def context_budget(user_text: str, *, max_k: int = 5, max_chars: int = 6000) -> Tuple[int, int]:
+    """
+    按用户问题长度决定本轮检索的 k 与上下文字数上限：短问题少取片段，减少送入模型的 prefill token。
+    切片最长约 1000 字（DocumentIngestor 默认 chunk_size），预算至少容纳 k 个完整切片。
+    """
+    k = min(max_k, 3) if len(user_text) < 80 else max_k
+    return k, min(max_chars, 1200 * k + 20 * len(user_text))
+
+
 def make_retrieval_tool(pipeline: RAGPipeline, *, k: int = 5, max_chars: int = 6000):
     """
     生成一个可被 Agent 调用的检索 Tool。
     Tool 的返回值是可直接塞进 prompt 的“带引用上下文”字符串。
+    k / max_chars 为默认值，可在调用 graph 时通过 configurable 的 rag_k / rag_max_chars 按轮覆盖，
+    无需为每轮重建 Tool 与 graph。
     """
 
     @tool("rag_retrieve", return_direct=False)
-    def rag_retrieve(query: str) -> str:
+    def rag_retrieve(query: str, config: RunnableConfig) -> str:
         """从本地 Chroma 向量库检索相关片段，返回带 source/page 的上下文。"""
-        docs = pipeline.retrieve_with_synonyms(query, k=k)
+        configurable = config.get("configurable") or {}
+        docs = pipeline.retrieve_with_synonyms(query, k=configurable.get("rag_k", k))
         if not docs:
             return "（未检索到相关片段）"
-        return _format_docs_for_context(docs, max_chars=max_chars)
+        return _format_docs_for_context(
+            docs, max_chars=configurable.get("rag_max_chars", max_chars)
+        )
 
     return rag_retrieve
 
@@ -1,17 +1,28 @@
 from __future__ import annotations
 
-import hashlib
+import os
+import shutil
 from typing import Iterable, List, Optional, TYPE_CHECKING
 
+import xxhash
 from langchain_core.documents import Document
 
 if TYPE_CHECKING:
     from langchain_chroma import Chroma
+    from langchain_community.vectorstores import FAISS
+
+# FAISS 索引保存在 persist_directory 下的子目录
+_FAISS_SUBDIR = "faiss_index"
+# HNSW 图中每个节点的邻居数
+_HNSW_M = 32
 
 class VectorStoreManager:
     """
     负责创建/持久化向量库
     提供增量写入与检索接口
+    backend:
+        - chroma（默认）：Chroma 持久化向量库
+        - faiss：内存中的 FAISS IndexHNSWFlat，写入后 save_local 落盘，启动时 load_local
     """
 
     def __init__(
@@ -19,23 +30,78 @@ class VectorStoreManager:
         embedding_function,
         collection_name: str = "rag_collection",
         persist_directory: str | None = "./chroma_langchain_db",
+        shard_size: int = 1024,
+        backend: str | None = None,
     ) -> None:
         self.collection_name = collection_name
         self.persist_directory = persist_directory
         self.embedding_function = embedding_function
-        self._vector_store: Optional["Chroma"] = None
+        # 分片写入的大小，限制大批量入库时 embeddings 的峰值内存
+        self.shard_size = shard_size
+        self.backend = (backend or os.getenv("VECTOR_BACKEND") or "chroma").strip().lower()
+        if self.backend not in ("chroma", "faiss"):
+            raise ValueError(f"❌ 不支持的 VECTOR_BACKEND：{self.backend}（可选 chroma/faiss）")
+        self._vector_store: Optional["Chroma | FAISS"] = None
 
     def reset_collection(self) -> None:
         """
         删除当前 collection（会清空向量库数据）。
         用于避免重复写入或重建索引。
         """
+        if self.backend == "faiss":
+            faiss_dir = self._faiss_dir()
+            if faiss_dir and os.path.isdir(faiss_dir):
+                shutil.rmtree(faiss_dir)
+            self._vector_store = None
+            return
         store = self._get_store()
         # langchain_chroma.Chroma 提供 delete_collection
         store.delete_collection()
         self._vector_store = None
 
-    def _get_store(self) -> "Chroma":
+    def _faiss_dir(self) -> str | None:
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, _FAISS_SUBDIR)
+
+    def _get_faiss_store(self) -> "FAISS":
+        try:
+            import faiss  # noqa: F401
+            from langchain_community.vectorstores import FAISS
+        except ModuleNotFoundError as e:
+            raise ModuleNotFoundError(
+                "缺少依赖：`faiss-cpu`（GPU 环境可用 `faiss-gpu`）。\n"
+                "请先安装：`pip install faiss-cpu`"
+            ) from e
+
+        faiss_dir = self._faiss_dir()
+        if faiss_dir and os.path.isdir(faiss_dir):
+            # 索引由本进程 save_local 生成，docstore 为 pickle，可信
+            return FAISS.load_local(
+                faiss_dir,
+                self.embedding_function,
+                allow_dangerous_deserialization=True,
+            )
+
+        # 新建空的 HNSW 索引；需要先探测一次 embedding 维度
+        dim = len(self.embedding_function.embed_query("dimension probe"))
+        return self._new_faiss_store(dim)
+
+    def _new_faiss_store(self, dim: int) -> "FAISS":
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+
+        return FAISS(
+            embedding_function=self.embedding_function,
+            index=faiss.IndexHNSWFlat(dim, _HNSW_M),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    def _get_store(self) -> "Chroma | FAISS":
+        if self._vector_store is None and self.backend == "faiss":
+            self._vector_store = self._get_faiss_store()
         if self._vector_store is None:
             try:
                 from langchain_chroma import Chroma
@@ -54,6 +120,8 @@ class VectorStoreManager:
     def count(self) -> int:
         """返回当前 collection 的记录数（无法获取时返回 0）。"""
         store = self._get_store()
+        if self.backend == "faiss":
+            return len(store.index_to_docstore_id)  # type: ignore[union-attr]
         try:
             if hasattr(store, "_collection") and getattr(store, "_collection") is not None:
                 return int(store._collection.count())  # type: ignore[attr-defined]
@@ -65,12 +133,14 @@ class VectorStoreManager:
         """
         为每个切片生成稳定 ID，用于避免重复写入。
         基于：source/page/start_index + 内容 hash。
+        ID 不涉及安全性，用 xxh3_128 代替 sha1，吞吐高一个数量级；
+        从旧版 sha1 ID 升级时需 reset_collection() 重建一次，避免新旧 ID 重复写入。
         """
         meta = doc.metadata or {}
         source = str(meta.get("source", ""))
         page = str(meta.get("page", ""))
         start_index = str(meta.get("start_index", ""))
-        content_hash = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+        content_hash = xxhash.xxh3_128_hexdigest(doc.page_content.encode("utf-8"))
         return f"{source}#p{page}#s{start_index}#{content_hash}"
 
     def add_documents(self, docs: Iterable[Document]) -> List[str]:
@@ -79,23 +149,87 @@ class VectorStoreManager:
         docs_list = list(docs)
         ids = [self._stable_id(d) for d in docs_list]
 
+        if self.backend == "faiss":
+            self._add_to_faiss(store, docs_list, ids)
+            return ids
+
         # 用 upsert 让重复运行可复用同一批 ids，但必须显式传 embeddings，
         # 否则 Chroma 会使用其默认 embedding_function（常见为 384 维），
         # 导致后续用外部 embeddings 查询时报维度不匹配。
         if hasattr(store, "_collection") and getattr(store, "_collection") is not None:
-            embeddings = self.embedding_function.embed_documents(
-                [d.page_content for d in docs_list]
-            )
-            store._collection.upsert(  # type: ignore[attr-defined]
-                ids=ids,
-                embeddings=embeddings,
-                documents=[d.page_content for d in docs_list],
-                metadatas=[d.metadata for d in docs_list],
-            )
+            for start in range(0, len(docs_list), self.shard_size):
+                shard = docs_list[start : start + self.shard_size]
+                shard_ids = ids[start : start + self.shard_size]
+                texts = [d.page_content for d in shard]
+                embeddings = self.embedding_function.embed_documents(texts)
+                store._collection.upsert(  # type: ignore[attr-defined]
+                    ids=shard_ids,
+                    embeddings=embeddings,
+                    documents=texts,
+                    metadatas=[d.metadata for d in shard],
+                )
             return ids
 
         return store.add_documents(docs_list, ids=ids)
 
+    def _add_to_faiss(self, store: "FAISS", docs_list: List[Document], ids: List[str]) -> None:
+        """FAISS 不支持 upsert：跳过已存在的 id，分片写入后整体落盘。"""
+        existing = set(store.index_to_docstore_id.values())
+        pending = [(d, i) for d, i in zip(docs_list, ids) if i not in existing]
+        for start in range(0, len(pending), self.shard_size):
+            shard = pending[start : start + self.shard_size]
+            texts = [d.page_content for d, _ in shard]
+            embeddings = self.embedding_function.embed_documents(texts)
+            store.add_embeddings(
+                text_embeddings=list(zip(texts, embeddings)),
+                metadatas=[d.metadata for d, _ in shard],
+                ids=[i for _, i in shard],
+            )
+        faiss_dir = self._faiss_dir()
+        if faiss_dir and pending:
+            store.save_local(faiss_dir)
+
+    def delete_sources(self, sources: Iterable[str]) -> None:
+        """删除指定 source（PDF 路径）对应的全部切片，用于增量重建。"""
+        source_set = set(sources)
+        if not source_set:
+            return
+        store = self._get_store()
+        if self.backend == "faiss":
+            self._delete_from_faiss(store, source_set)
+            return
+        store._collection.delete(  # type: ignore[union-attr]
+            where={"source": {"$in": sorted(source_set)}}
+        )
+
+    def _delete_from_faiss(self, store: "FAISS", source_set: set[str]) -> None:
+        """
+        HNSW 索引不支持 remove_ids：取回保留条目的向量（reconstruct，无需重新 embedding），
+        重建一个新索引并落盘。
+        """
+        keep = [
+            (pos, doc_id, store.docstore.search(doc_id))
+            for pos, doc_id in sorted(store.index_to_docstore_id.items())
+        ]
+        keep = [
+            item for item in keep if (item[2].metadata or {}).get("source") not in source_set
+        ]
+        if len(keep) == len(store.index_to_docstore_id):
+            return
+
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        new_store = self._new_faiss_store(store.index.d)
+        if keep:
+            new_store.add_embeddings(
+                text_embeddings=[(doc.page_content, vectors[pos]) for pos, _, doc in keep],
+                metadatas=[doc.metadata for _, _, doc in keep],
+                ids=[doc_id for _, doc_id, _ in keep],
+            )
+        self._vector_store = new_store
+        faiss_dir = self._faiss_dir()
+        if faiss_dir:
+            new_store.save_local(faiss_dir)
+
     def as_retriever(self, k: int = 3):
         """返回检索器接口，供上层链路使用。"""
         store = self._get_store()
@@ -104,6 +238,21 @@ class VectorStoreManager:
     def similarity_search(self, query: str, k: int = 3) -> List[Document]:
         store = self._get_store()
         return store.similarity_search(query, k=k)
+
+    async def asimilarity_search(self, query: str, k: int = 3) -> List[Document]:
+        store = self._get_store()
+        return await store.asimilarity_search(query, k=k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 3) -> List[Document]:
+        """用已算好的查询向量检索，跳过 embedding。"""
+        store = self._get_store()
+        return store.similarity_search_by_vector(embedding, k=k)
+
+    async def asimilarity_search_by_vector(
+        self, embedding: List[float], k: int = 3
+    ) -> List[Document]:
+        store = self._get_store()
+        return await store.asimilarity_search_by_vector(embedding, k=k)
     
 def main() -> None:
     """
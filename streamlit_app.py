@@ -1,81 +1,178 @@
 from __future__ import annotations
 
 import os
-from pathlib import Path
+import secrets
+import time
+from collections import deque
+from typing import Iterable, Iterator, Optional
 
 import streamlit as st
-from langchain.agents.factory import create_agent
-from langgraph.checkpoint.memory import MemorySaver
 
-from rag.pipeline import RAGPipeline
-from rag.tools import make_retrieval_tool
+# rag.runtime 本身很轻，重量级依赖在首次 get_* 时才导入
+from rag.runtime import (
+    ensure_index,
+    get_chat_history,
+    start_prewarm,
+    stream_turn,
+    submit_background,
+)
 
 
 APP_TITLE = "RAG 多方安全计算知识助手"
+# 流式输出时两次刷新 UI 的最小间隔（秒）
+_RENDER_INTERVAL_S = 0.05
+# 会话内保留的最大消息条数；每次 rerun 的渲染开销与会话长度无关
+_HISTORY_MAXLEN = 200
+# 设置后改为调用 rag.serve 推理服务（如 http://localhost:8800），
+# 多个 Streamlit worker 共享同一份模型与向量库；未设置时在本进程内推理
+_SERVE_URL = (os.getenv("RAG_SERVE_URL") or "").rstrip("/")
+
+
+def _build_index(data_dir: str, reset: bool) -> None:
+    if not _SERVE_URL:
+        ensure_index(data_dir, reset=reset)
+        return
+    import httpx
 
-
-@st.cache_resource
-def _get_pipeline() -> RAGPipeline:
-    return RAGPipeline()
+    # 建库耗时不定，不设超时
+    resp = httpx.post(
+        f"{_SERVE_URL}/index", json={"data_dir": data_dir, "reset": reset}, timeout=None
+    )
+    resp.raise_for_status()
 
 
-@st.cache_resource
-def _get_agent_graph() -> object:
-    pipeline = _get_pipeline()
-    rag_tool = make_retrieval_tool(pipeline, k=5, max_chars=7000)
+def _ensure_index_ready(data_dir: str) -> None:
+    # 每个会话开始时在后台按清单增量同步一次，不阻塞首屏（也不等待预热中的模型加载）；
+    # 与其他会话的建库任务在同一后台线程中排队执行。rerun 时不再提交
+    ss = st.session_state
+    if ss.get("_index_ready") or "_build_future" in ss:
+        return
+    ss["_build_future"] = submit_background(_build_index, data_dir, False)
+    # 自动同步成功时不提示，失败时照常显示错误
+    ss["_build_quiet"] = True
+    ss["_index_ready"] = True
 
-    system_prompt = (
-        "你是一个中文知识助手。你可以调用工具从本地知识库检索内容。\n"
-        "当用户的问题需要依据文档回答时：先调用 rag_retrieve 获取上下文，再基于上下文回答。\n"
-        "回答要求：\n"
-        "- 若上下文中没有答案，明确说明“文档未包含”。\n"
-        "- 尽量给出引用（用 [n] 标号即可）。\n"
-    )
 
-    # MemorySaver：按 thread_id 维护对话状态
-    checkpointer = MemorySaver()
-    graph = create_agent(
-        model=pipeline.llm,
-        tools=[rag_tool],
-        system_prompt=system_prompt,
-        checkpointer=checkpointer,
-    )
-    return graph
+def _render_build_status() -> None:
+    """每次 rerun 轮询后台建库任务：进行中显示状态，完成后清理并提示结果。"""
+    future = st.session_state.get("_build_future")
+    if future is None:
+        return
+    if not future.done():
+        st.info("正在后台更新向量库…页面可继续操作，任意交互后刷新状态。")
+        return
+    del st.session_state["_build_future"]
+    quiet = st.session_state.pop("_build_quiet", False)
+    exc = future.exception()
+    if exc is not None:
+        st.error(f"更新向量库失败：{exc}")
+        return
+    st.session_state["_index_ready"] = True
+    if not quiet:
+        st.success("向量库已更新。")
+
+
+def _remote_turn(user_text: str, thread_id: str) -> Iterator[Optional[str]]:
+    """读取推理服务的 SSE 流，产出约定与 rag.runtime.stream_turn 相同。"""
+    import httpx
+    import orjson
+
+    with httpx.stream(
+        "POST",
+        f"{_SERVE_URL}/chat",
+        json={"thread_id": thread_id, "text": user_text},
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    ) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = orjson.loads(line[6:])
+            if event["type"] == "delta":
+                yield event["text"]
+            elif event["type"] == "reset":
+                yield None
+
+
+def _render_stream(pieces: Iterable[Optional[str]], placeholder) -> str:
+    """
+    边接收边刷新占位符，返回最终回答文本。
+    - 收到 None 时清空已累积的中间文本并立即重绘占位符（工具调用后模型会重新作答）
+    - UI 刷新节流到约 50ms 一次，避免长回答触发大量重绘
+    """
+    acc = ""
+    last_render = 0.0
+    for piece in pieces:
+        if piece is None:
+            acc = ""
+            placeholder.markdown("思考中…")
+            continue
+        acc += piece
+        now = time.monotonic()
+        if now - last_render >= _RENDER_INTERVAL_S:
+            placeholder.markdown(acc)
+            last_render = now
+    return acc
+
+
+def _init_session() -> None:
+    """
+    会话首次运行时一次性初始化 thread_id 与消息历史。
+    thread_id 记在 URL 查询参数中：刷新或重新打开同一链接时从本地存储回放历史，
+    agent 的对话记忆（同样按 thread_id 存储）也随之恢复。
+    """
+    ss = st.session_state
+    if "_inited" in ss:
+        return
+    thread_id = st.query_params.get("thread")
+    if thread_id:
+        history = get_chat_history().load(thread_id, limit=_HISTORY_MAXLEN)
+    else:
+        thread_id = secrets.token_hex(8)
+        st.query_params["thread"] = thread_id
+        history = []
+    ss.thread_id = thread_id
+    ss.messages = deque(history, maxlen=_HISTORY_MAXLEN)
+    ss._inited = True
 
 
-def _ensure_index_ready(pipeline: RAGPipeline, data_dir: str) -> None:
-    db_dir = Path("./chroma_langchain_db")
-    if db_dir.exists():
-        return
-    pipeline.build_index([data_dir], reset=False, skip_if_exists=True)
+def _append_message(role: str, content: str) -> None:
+    """追加到会话内存，并异步写入本地存储。"""
+    st.session_state.messages.append({"role": role, "content": content})
+    get_chat_history().append(st.session_state.thread_id, role, content)
 
 
 def main() -> None:
     st.set_page_config(page_title=APP_TITLE, layout="wide")
     st.title(APP_TITLE)
-
-    pipeline = _get_pipeline()
-    agent_graph = _get_agent_graph()
+    if not _SERVE_URL:
+        # 进程内只启动一次；页面渲染期间后台加载模型
+        start_prewarm()
+    _init_session()
 
     with st.sidebar:
         st.header("设置")
         data_dir = st.text_input("PDF 目录", value="user_data/documents")
-        auto_index = st.checkbox("启动时自动建库（若不存在）", value=True)
-        if st.button("强制重建向量库"):
-            pipeline.build_index([data_dir], reset=True, skip_if_exists=False)
-            st.success("已重建向量库。")
+        auto_index = st.checkbox("启动时自动建库 / 增量更新", value=True)
+        building = "_build_future" in st.session_state
+        # 增量更新只处理新增 / 变化 / 移除的 PDF；强制重建会重新 embedding 全部文档
+        if st.button("增量更新向量库", disabled=building):
+            st.session_state["_build_future"] = submit_background(
+                _build_index, data_dir, False
+            )
+        if st.button("强制重建向量库", disabled=building):
+            st.session_state["_index_ready"] = False
+            # 在后台线程重建（同时清空语义缓存：文档已变化，旧回答不再可信），不阻塞页面
+            st.session_state["_build_future"] = submit_background(
+                _build_index, data_dir, True
+            )
+        _render_build_status()
         st.caption(
             "提示：首次建库会下载 embedding 模型，耗时较长；后续会复用本地缓存与向量库。"
         )
 
     if auto_index:
-        _ensure_index_ready(pipeline, data_dir)
-
-    if "thread_id" not in st.session_state:
-        st.session_state.thread_id = os.urandom(8).hex()
-
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+        _ensure_index_ready(data_dir)
 
     for m in st.session_state.messages:
         with st.chat_message(m["role"]):
@@ -85,7 +182,8 @@ def main() -> None:
     if not user_text:
         return
 
-    st.session_state.messages.append({"role": "user", "content": user_text})
+    thread_id = st.session_state.thread_id
+    _append_message("user", user_text)
     with st.chat_message("user"):
         st.markdown(user_text)
 
@@ -93,25 +191,14 @@ def main() -> None:
         placeholder = st.empty()
         placeholder.markdown("思考中…")
 
-        # create_agent 的 graph 走的是 messages state；thread_id 用于记忆
-        result = agent_graph.invoke(
-            {"messages": [("user", user_text)]},
-            config={"configurable": {"thread_id": st.session_state.thread_id}},
-        )
-
-        # result 结构：{"messages": [...]}，取最后一条 AI 消息
-        final_text = ""
-        try:
-            msgs = result.get("messages", [])
-            if msgs:
-                final_text = getattr(msgs[-1], "content", str(msgs[-1]))
-        except Exception:
-            final_text = str(result)
-
+        if _SERVE_URL:
+            pieces = _remote_turn(user_text, thread_id)
+        else:
+            pieces = stream_turn(user_text, thread_id)
+        final_text = _render_stream(pieces, placeholder)
         placeholder.markdown(final_text or "（未生成内容）")
-        st.session_state.messages.append({"role": "assistant", "content": final_text})
+        _append_message("assistant", final_text)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,78 @@
+"""RAGPipeline.build_index 按文件清单增量更新的测试（向量库 / 切分用内存桩替代）。"""
+
+from langchain_core.documents import Document
+
+from rag.data_preparation import DocumentIngestor
+from rag.pipeline import RAGPipeline
+
+
+class _FakeIngestor:
+    resolve_pdf_paths = DocumentIngestor.resolve_pdf_paths
+
+    def ingest(self, paths):
+        return [Document(page_content="x", metadata={"source": p}) for p in paths]
+
+
+class _FakeVectorStore:
+    def __init__(self, persist_directory):
+        self.persist_directory = persist_directory
+        self.sources = []
+
+    def count(self):
+        return len(self.sources)
+
+    def reset_collection(self):
+        self.sources = []
+
+    def add_documents(self, docs):
+        self.sources.extend(d.metadata["source"] for d in docs)
+        return [str(i) for i in range(len(docs))]
+
+    def delete_sources(self, sources):
+        removed = set(sources)
+        self.sources = [s for s in self.sources if s not in removed]
+
+
+def _make_pipeline(tmp_path):
+    return RAGPipeline(
+        ingestor=_FakeIngestor(),
+        embedding_provider=object(),
+        vector_store=_FakeVectorStore(str(tmp_path / "db")),
+        llm=object(),
+    )
+
+
+def _write_pdf(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"%PDF-1.4")
+    return str(path)
+
+
+def test_second_directory_keeps_first_directory_chunks(tmp_path):
+    pipeline = _make_pipeline(tmp_path)
+    a = _write_pdf(tmp_path / "a" / "1.pdf")
+    b = _write_pdf(tmp_path / "b" / "2.pdf")
+
+    assert pipeline.build_index([str(tmp_path / "a")])
+    assert pipeline.build_index([str(tmp_path / "b")])
+
+    assert sorted(pipeline.vector_store.sources) == sorted([a, b])
+    assert set(pipeline._load_manifest()) == {a, b}
+    # 两个目录都未变化时不再写入
+    assert not pipeline.build_index([str(tmp_path / "a")])
+    assert sorted(pipeline.vector_store.sources) == sorted([a, b])
+
+
+def test_removed_file_only_affects_its_own_directory(tmp_path):
+    pipeline = _make_pipeline(tmp_path)
+    a = _write_pdf(tmp_path / "a" / "1.pdf")
+    b = _write_pdf(tmp_path / "b" / "2.pdf")
+    pipeline.build_index([str(tmp_path / "a")])
+    pipeline.build_index([str(tmp_path / "b")])
+
+    (tmp_path / "a" / "1.pdf").unlink()
+    assert pipeline.build_index([str(tmp_path / "a")])
+
+    assert pipeline.vector_store.sources == [b]
+    assert set(pipeline._load_manifest()) == {b}
+    assert a not in pipeline.vector_store.sources
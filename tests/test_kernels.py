@@ -0,0 +1,43 @@
+"""编译内核与 DocumentIngestor._is_noise_chunk 正则规则的等价性测试。"""
+
+import random
+import re
+
+from rag.kernels import classify_chunk_bytes, to_kernel_bytes
+
+# 与 rag/data_preparation.py 中的正则规则保持一致
+_DOT_LEADER_SPACED = re.compile(r"(\.\s*){20,}")
+_DOT_LEADER = re.compile(r"\.{8,}")
+_TRAILING_PAGENUM = re.compile(r"\s\d{1,4}\s*$")
+
+# 覆盖 ASCII / Unicode 空白、全角与其他文字的十进制数字、点号、CHAPTER 关键词、中文
+_ALPHABET = [
+    ".", ".", ".", " ", " ", "\t", "\n", "\x1c", "\xa0", "\u3000", "\u2028",
+    "0", "7", "\uff13", "\u0663", "a", "Z", "?", "中", "文", "CHAPTER", "chapter", "ChApTeR",
+]
+
+
+def _regex_is_noise(text: str) -> bool:
+    if _DOT_LEADER_SPACED.search(text) or _DOT_LEADER.search(text):
+        return True
+    if "CHAPTER" in text.upper() and len(text) < 400:
+        return True
+    dot_ratio = text.count(".") / max(1, len(text))
+    return dot_ratio > 0.18 and _TRAILING_PAGENUM.search(text) is not None
+
+
+def _kernel_is_noise(text: str) -> bool:
+    return classify_chunk_bytes(to_kernel_bytes(text)) != 0
+
+
+def test_unicode_whitespace_and_digits():
+    for text in ["Ca.\u30003", "Ca.\xa0\uff13", "ab.. \u0663\u3000", "x" * 10 + "." * 3 + " 12"]:
+        assert _kernel_is_noise(text) == _regex_is_noise(text), repr(text)
+
+
+def test_matches_regex_rules_on_random_text():
+    rng = random.Random(0)
+    for _ in range(20000):
+        n = rng.choice([rng.randint(1, 40), rng.randint(380, 420)])
+        text = "".join(rng.choice(_ALPHABET) for _ in range(n))
+        assert _kernel_is_noise(text) == _regex_is_noise(text), repr(text)